@@ -0,0 +1,111 @@
+import time
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.deep_sage.checkpoint import ContentAddressedSerializer
+from src.deep_sage.state import ReportState, Section
+
+SECTION_CHARS = 8000
+SOURCE_CHARS = 4000
+SOURCES_PER_SECTION = 5
+REPEATS = 5
+
+
+def make_sources(prefix: str) -> dict:
+    return {
+        f'https://example.com/{prefix}/{i}': {'title': f'{prefix} source {i}', 'content': f'{prefix}-{i} ' * (SOURCE_CHARS // 8)}
+        for i in range(SOURCES_PER_SECTION)
+    }
+
+
+def report_steps(number_of_sections: int) -> list[ReportState]:
+    """States after each node of the graph (planner, sections writer, final writer, finalizer)."""
+    state = ReportState(
+        content='',
+        iteration=0,
+        report_title='',
+        sections=[],
+        search_queries=[],
+        source_str='planner context ' * 2000,
+        steps=[],
+        token_usage={},
+        topic='Benchmark topic',
+        unique_sources=make_sources('planner'),
+    )
+    states = []
+
+    # Planner
+    state.sections = [
+        Section(name=f'Section {i}', description=f'Description {i}', research=0 < i < number_of_sections - 1, content='', unique_sources={})
+        for i in range(number_of_sections)
+    ]
+    state.steps.append('planner')
+    states.append(state.model_copy(deep=True))
+
+    # Sections Writer
+    for section in state.sections:
+        if section.research:
+            section.content = f'{section.name} content ' * (SECTION_CHARS // 16)
+            section.unique_sources = make_sources(section.name)
+    state.steps.append('sections_writer')
+    states.append(state.model_copy(deep=True))
+
+    # Final Writer
+    for section in state.sections:
+        if not section.research:
+            section.content = f'{section.name} synthesis ' * (SECTION_CHARS // 16)
+    state.report_title = 'Benchmark Report'
+    state.steps.append('final_writer')
+    states.append(state.model_copy(deep=True))
+
+    # Finalizer
+    state.unique_sources = {k: v for s in state.sections if s.research for k, v in s.unique_sources.items()}
+    state.content = ''.join([f'\n\n## {section.name}\n\n{section.content}' for section in state.sections])
+    state.steps.append('finalizer')
+    states.append(state.model_copy(deep=True))
+    return states
+
+
+def checkpoint_cost(serde, states: list[ReportState]) -> list[tuple[float, int]]:
+    """Serialize every field after every step, as the checkpointer does, and return (seconds, bytes written) per step."""
+    costs = []
+    for state in states:
+        blob_bytes = getattr(serde, 'blob_bytes', 0)
+        n_bytes = 0
+        t1 = time.perf_counter()
+        for field in type(state).model_fields:
+            _, data = serde.dumps_typed(getattr(state, field))
+            n_bytes += len(data)
+        t2 = time.perf_counter()
+        n_bytes += getattr(serde, 'blob_bytes', 0) - blob_bytes
+        costs.append((t2 - t1, n_bytes))
+    return costs
+
+
+def best_of(serde_factory, states: list[ReportState]) -> list[tuple[float, int]]:
+    """Best time of REPEATS runs per step, each run with a new serializer (empty blob store) like a new report."""
+    runs = [checkpoint_cost(serde=serde_factory(), states=states) for _ in range(REPEATS)]
+    return [(min(r[i][0] for r in runs), runs[0][i][1]) for i in range(len(states))]
+
+
+def main():
+    # Time > 1x is the serialization time regression of CAS, Size < 1x its byte savings
+    print(f"{'Sections':>8} | {'Step':>15} | {'Default (ms)':>12} | {'Default (KB)':>12} | {'CAS (ms)':>8} | {'CAS (KB)':>8} | "
+          f"{'Time':>6} | {'Size':>6}")
+    for number_of_sections in [4, 8, 16, 32, 64]:
+        states = report_steps(number_of_sections=number_of_sections)
+        default_costs = best_of(serde_factory=JsonPlusSerializer, states=states)
+        cas_costs = best_of(serde_factory=ContentAddressedSerializer, states=states)
+        steps = [state.steps[-1] for state in states]
+        rows = list(zip(steps, default_costs, cas_costs))
+        rows.append(('total',
+                     (sum(t for t, _ in default_costs), sum(b for _, b in default_costs)),
+                     (sum(t for t, _ in cas_costs), sum(b for _, b in cas_costs))))
+        for step, (default_time, default_bytes), (cas_time, cas_bytes) in rows:
+            print(f'{number_of_sections:>8} | {step:>15} | {default_time * 1e3:>12.2f} | {default_bytes / 1024:>12.1f} | '
+                  f'{cas_time * 1e3:>8.2f} | {cas_bytes / 1024:>8.1f} | '
+                  f'{cas_time / default_time:>5.2f}x | {cas_bytes / default_bytes:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import hashlib
+import importlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+
+STR_BLOB_KEY = '__str_blob__'
+DICT_BLOB_KEY = '__dict_blob__'
+MODEL_KEY = '__model__'
+FIELDS_KEY = '__fields__'
+TYPE_PREFIX = 'cas+'
+REF_SIZE = 48  # Approximate serialized size of a blob reference
+SCALAR_SIZE = 8
+
+# Thread of the checkpoint being serialized, blobs stored meanwhile are owned by it
+_current_owner: ContextVar[Optional[str]] = ContextVar('deep_sage_blob_owner', default=None)
+
+
+class ContentAddressedSerializer(SerializerProtocol):
+    """
+    Checkpoint serializer storing large strings and dicts as deduplicated, content-addressed blobs.
+
+    LangGraph writes every field of ReportState after every node. Most of those fields (source_str,
+    section contents, unique_sources, ...) do not change between steps, so the default serializer
+    copies the same text into each checkpoint again. This serializer replaces every string and dict
+    larger than `min_blob_size` bytes with a reference to a blob keyed by its hash. A blob is stored
+    once, so an unchanged field only costs its references in the following checkpoints and only
+    changed content adds new bytes. Blobs are kept in memory next to the checkpoints, which matches
+    the in-process MemorySaver used by the Researcher.
+
+    Blobs stored while serializing the checkpoints of a thread (see `owner`) are owned by that thread
+    and freed by `release` once no thread owns them anymore (see ContentAddressedMemorySaver).
+
+    Args:
+        min_blob_size: Length from which strings (characters) and serialized dicts (bytes) are moved to blobs.
+        serde: Serializer used for the reference tree and for all other objects.
+    """
+    def __init__(self, min_blob_size: int = 1024, serde: SerializerProtocol | None = None):
+        self.min_blob_size = min_blob_size
+        self.serde = serde or JsonPlusSerializer()
+        self.blobs: dict[str, str | bytes] = {}
+        self._str_keys: dict[int, str] = {}  # id of a stored string -> its blob key
+        self._owners: dict[str, set[str]] = {}  # blob key -> threads
+        self._owned: dict[str, set[str]] = {}  # thread -> blob keys
+        self._lock = threading.Lock()
+
+    @property
+    def blob_bytes(self) -> int:
+        return sum(len(b) for b in self.blobs.values())
+
+    @contextmanager
+    def owner(self, thread_id: str) -> Iterator[None]:
+        """Attribute the blobs stored in the context to the given thread."""
+        token = _current_owner.set(thread_id)
+        try:
+            yield
+        finally:
+            _current_owner.reset(token)
+
+    def release(self, thread_id: str) -> None:
+        """Drop the blobs of the thread that are not owned by any other thread."""
+        with self._lock:
+            for key in self._owned.pop(thread_id, set()):
+                owners = self._owners.get(key)
+                if owners is None:
+                    continue
+                owners.discard(thread_id)
+                if not owners:
+                    del self._owners[key]
+                    blob = self.blobs.pop(key, None)
+                    if isinstance(blob, str) and self._str_keys.get(id(blob)) == key:
+                        del self._str_keys[id(blob)]
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        packed, _ = self._pack(obj)
+        if packed is obj:
+            return self.serde.dumps_typed(obj)
+        type_, data = self.serde.dumps_typed(packed)
+        return f'{TYPE_PREFIX}{type_}', data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, data_ = data
+        if not type_.startswith(TYPE_PREFIX):
+            return self.serde.loads_typed(data)
+        packed = self.serde.loads_typed((type_.removeprefix(TYPE_PREFIX), data_))
+        return self._unpack(packed)
+
+    def _own(self, key: str) -> None:
+        # Called with the lock held, together with the store, so that a concurrent release cannot drop the blob in between
+        thread_id = _current_owner.get()
+        if thread_id is not None:
+            self._owners.setdefault(key, set()).add(thread_id)
+            self._owned.setdefault(thread_id, set()).add(key)
+
+    def _put(self, data: bytes) -> str:
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._lock:
+            self.blobs.setdefault(key, data)
+            self._own(key)
+        return key
+
+    def _put_str(self, s: str) -> str:
+        # State fields that did not change are the very same string objects in the next step,
+        # so hashing is skipped for strings that are already stored.
+        key = self._str_keys.get(id(s))
+        if key is None or self.blobs.get(key) is not s:
+            key = hashlib.blake2b(s.encode('utf-8'), digest_size=16).hexdigest()
+        with self._lock:
+            if key not in self.blobs:
+                self.blobs[key] = s
+                self._str_keys[id(s)] = key
+            self._own(key)
+        return key
+
+    def _pack(self, obj: Any) -> tuple[Any, int]:
+        """
+        Replace large values with blob references.
+
+        Returns the packed value (`obj` itself when nothing is replaced) and an estimate of its
+        serialized size, so that dicts are only serialized once they are known to be large.
+        """
+        if isinstance(obj, str):
+            if len(obj) < self.min_blob_size:
+                return obj, len(obj) + 2
+            return {STR_BLOB_KEY: self._put_str(obj)}, REF_SIZE
+        elif isinstance(obj, dict):
+            packed, size, changed = {}, 2, False
+            for k, v in obj.items():
+                p, p_size = self._pack(v)
+                packed[k] = p
+                size += p_size + (len(k) + 2 if isinstance(k, str) else SCALAR_SIZE)
+                changed = changed or p is not v
+            if size >= self.min_blob_size:
+                type_, data = self.serde.dumps_typed(packed)
+                return {DICT_BLOB_KEY: [type_, self._put(data)]}, REF_SIZE
+            return (packed if changed else obj), size
+        elif isinstance(obj, list):
+            packed, size, changed = [], 2, False
+            for v in obj:
+                p, p_size = self._pack(v)
+                packed.append(p)
+                size += p_size
+                changed = changed or p is not v
+            return (packed if changed else obj), size
+        elif isinstance(obj, BaseModel):
+            packed, size, changed = {}, 2 + REF_SIZE, False
+            for name in type(obj).model_fields:
+                v = getattr(obj, name)
+                p, p_size = self._pack(v)
+                packed[name] = p
+                size += p_size + len(name) + 2
+                changed = changed or p is not v
+            if not changed:
+                return obj, size
+            return {MODEL_KEY: f'{type(obj).__module__}:{type(obj).__qualname__}', FIELDS_KEY: packed}, size
+        else:
+            return obj, SCALAR_SIZE
+
+    def _unpack(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if STR_BLOB_KEY in obj:
+                return self.blobs[obj[STR_BLOB_KEY]]
+            elif DICT_BLOB_KEY in obj:
+                type_, key = obj[DICT_BLOB_KEY]
+                return self._unpack(self.serde.loads_typed((type_, self.blobs[key])))
+            elif MODEL_KEY in obj:
+                module_name, class_name = obj[MODEL_KEY].split(':')
+                cls = getattr(importlib.import_module(module_name), class_name)
+                return cls.model_construct(**{k: self._unpack(v) for k, v in obj[FIELDS_KEY].items()})
+            return {k: self._unpack(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [self._unpack(v) for v in obj]
+        else:
+            return obj
+
+
+class ContentAddressedMemorySaver(MemorySaver):
+    """
+    MemorySaver using a ContentAddressedSerializer, whose blobs are owned by the threads that stored them.
+
+    Deleting a thread also frees the blobs that no other thread refers to.
+    """
+    def __init__(self, serde: Optional[ContentAddressedSerializer] = None):
+        self.cas = serde or ContentAddressedSerializer()
+        super().__init__(serde=self.cas)
+
+    def put(self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        with self.cas.owner(config['configurable']['thread_id']):
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = '') -> None:
+        with self.cas.owner(config['configurable']['thread_id']):
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self.cas.release(thread_id)
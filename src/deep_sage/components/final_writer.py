@@ -2,11 +2,11 @@ import asyncio
 from typing import Any, Final
 
 from langchain_core.runnables import RunnableConfig
-from langchain_core.callbacks import get_usage_metadata_callback
 from langchain.chat_models import init_chat_model
 from pydantic import BaseModel
 
 from ..enums import Node
+from ..usage import get_usage_ledger, usage_scope, with_usage_ledger
 
 WRITING_INSTRUCTIONS = """
 You are an expert writer working on writing a section that synthesizes information from the rest of the report about a given topic.
@@ -67,6 +67,52 @@ Think carefully about the provided context first. Then write the section.
 </Task>
 """
 
+BUDGET_WRITING_INSTRUCTIONS = """
+You are an expert writer working on writing a main body section of a report about a given topic.
+
+<Goal>
+Write a concise section from the initial search results of the report only, since the web research for this section was stopped by the cost budget.
+</Goal>
+
+The topic you are writing about:
+<topic>
+{topic}
+</topic>
+
+The name/title of the section you are going to write:
+<section name>
+{section_name}
+</section>>
+
+The description of the section you are going to write:
+<section description>
+{section_description}
+</section description>
+
+The initial search results of the report:
+<context>
+{context}
+</context>
+
+<Requirements>
+- Use only the information given in the search results, do not add facts from elsewhere.
+- If the search results do not cover a part of the section description, say so briefly instead of filling it in.
+- Keep the section short and focused on the section description.
+- No sources section needed.
+</Requirements>
+
+<Formatting>
+- Start directly with the section writing, without preamble or titles. Do not use XML tags in the output.  
+</Formatting>
+
+<Task>
+Think carefully about the provided search results first. Then write the section.
+</Task>
+"""
+
+# Marks the sections whose web research was stopped by the cost budget in the report
+BUDGET_NOTE = '*Note: The web research for this section was stopped by the cost budget (max_cost_usd). It is based on the initial search results of the report only.*\n\n'
+
 REPORT_TITLE_INSTRUCTIONS = """
 You are an expert writer working on writing a title for the report about a given topic.
 
@@ -109,14 +155,33 @@ class FinalWriter:
             **model_params['model_args']
         )
 
+    @with_usage_ledger
+    @usage_scope(node=Node.FINAL_WRITER)
     def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
 
+        event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(event_loop)
+
+        # Sections whose research was stopped by the cost budget are written from the search results of the planner
+        budget_stopped_idx = [idx for (idx, section) in enumerate(state.sections) if section.budget_stopped]
+        tasks = [
+            self.write_budget_stopped_section(
+                topic = state.topic,
+                section_name = state.sections[idx].name,
+                section_description = state.sections[idx].description,
+                context = state.source_str
+            ) for idx in budget_stopped_idx
+        ]
+        out_list = event_loop.run_until_complete(asyncio.gather(*tasks))
+        for (idx, s) in enumerate(out_list):
+            state.sections[budget_stopped_idx[idx]].content = BUDGET_NOTE + s['content']
+            state.sections[budget_stopped_idx[idx]].unique_sources = dict(state.unique_sources)
+
         # Report context written previously (for the sections requiring research)
         context = ''.join(
             [f'## {section.name}\n\n{section.content}\n\n' for section in state.sections if section.research]
         )
 
-        event_loop = asyncio.new_event_loop()
         tasks = [
             self.write_section(
                 topic = state.topic,
@@ -127,12 +192,11 @@ class FinalWriter:
         ]
         out_list = event_loop.run_until_complete(asyncio.gather(*tasks))
         event_loop.close()
+        asyncio.set_event_loop(None)
 
         non_research_idx = [idx for (idx, section) in enumerate(state.sections) if not section.research]
         for (idx, s) in enumerate(out_list):
             state.sections[non_research_idx[idx]].content = s['content']
-            state.token_usage[self.model_name]['input_tokens'] += s['token_usage'][self.model_name]['input_tokens']
-            state.token_usage[self.model_name]['output_tokens'] += s['token_usage'][self.model_name]['output_tokens']
 
         # All the report context including the final sections written above
         # Theoretically, the final (non-research) sections can be anywhere in the report (Planner decides)
@@ -140,8 +204,7 @@ class FinalWriter:
         context = ''.join([f'## {section.name}\n\n{section.content}\n\n' for section in state.sections])
         out_dict = self.write_report_title(topic=state.topic, context=context)
 
-        state.token_usage[self.model_name]['input_tokens'] += out_dict['token_usage'][self.model_name]['input_tokens']
-        state.token_usage[self.model_name]['output_tokens'] += out_dict['token_usage'][self.model_name]['output_tokens']
+        state.token_usage = get_usage_ledger().token_usage(models=[*state.token_usage.keys()])
         state.report_title = out_dict['title']
         state.steps.append(Node.FINAL_WRITER)
 
@@ -149,31 +212,38 @@ class FinalWriter:
 
 
     async def write_section(self, topic: str, section_name: str, section_description: str, context: str) -> dict[str, Any]:
+        instructions = WRITING_INSTRUCTIONS.format(
+            topic=topic,
+            section_name=section_name,
+            section_description=section_description,
+            context=context,
+        )
+        results = await self.writer_llm.ainvoke(instructions)
+        out_dict = {
+            'content': results.content,
+        }
+        return out_dict
 
-        with get_usage_metadata_callback() as cb:
-            instructions = WRITING_INSTRUCTIONS.format(
-                topic=topic,
-                section_name=section_name,
-                section_description=section_description,
-                context=context,
-            )
-            results = await self.writer_llm.ainvoke(instructions)
-            out_dict = {
-                'content': results.content,
-                'token_usage': cb.usage_metadata
-            }
+    async def write_budget_stopped_section(self, topic: str, section_name: str, section_description: str, context: str) -> dict[str, Any]:
+        instructions = BUDGET_WRITING_INSTRUCTIONS.format(
+            topic=topic,
+            section_name=section_name,
+            section_description=section_description,
+            context=context,
+        )
+        results = await self.writer_llm.ainvoke(instructions)
+        out_dict = {
+            'content': results.content,
+        }
         return out_dict
 
     def write_report_title(self, topic: str, context: str) -> dict[str, Any]:
-
-        with get_usage_metadata_callback() as cb:
-            instructions = REPORT_TITLE_INSTRUCTIONS.format(
-                topic=topic,
-                context=context,
-            )
-            results = self.writer_llm.invoke(instructions)
-            out_dict = {
-                'title': results.content,
-                'token_usage': cb.usage_metadata
-            }
+        instructions = REPORT_TITLE_INSTRUCTIONS.format(
+            topic=topic,
+            context=context,
+        )
+        results = self.writer_llm.invoke(instructions)
+        out_dict = {
+            'title': results.content,
+        }
         return out_dict
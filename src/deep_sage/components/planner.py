@@ -1,7 +1,6 @@
 import json
 from typing import Any, Final
 
-from langchain_core.callbacks import get_usage_metadata_callback
 from langchain_core.runnables import RunnableConfig
 from langchain.chat_models import init_chat_model
 from pydantic import BaseModel
@@ -10,6 +9,8 @@ from ai_common import get_config_from_runnable
 from ai_common.components import QueryWriter, WebSearchNode
 from ..enums import Node
 from ..state import Section
+from ..structured_output import coerce_section, parse_json_object
+from ..usage import get_usage_ledger, usage_scope, with_usage_ledger
 
 PLANNER_INSTRUCTIONS = """
 You are an expert writer planning the outline of sections of a report about a given topic.
@@ -86,6 +87,32 @@ Your response must include a 'sections' field containing a list of sections.
 Each section must have: name, description, research, content, unique_sources fields.
 """
 
+PLAN_REPAIR_INSTRUCTIONS = """
+The following text is a report plan that should have been a JSON object, but it could not be parsed.
+
+<text>
+{text}
+</text>
+
+Convert it into a JSON object with a 'sections' field containing a list of sections.
+Each section must have the fields: "name" (string), "description" (string), "research" ("yes" or "no"), "content" (empty string), "unique_sources" (empty object).
+Return only the JSON object.
+"""
+
+SECTION_REPAIR_INSTRUCTIONS = """
+The following JSON fragment should describe a section of a report, but it is invalid.
+
+<fragment>
+{fragment}
+</fragment>
+
+<error>
+{error}
+</error>
+
+Fix the fragment. Return only a JSON object with the fields: "name" (string), "description" (string), "research" ("yes" or "no"), "content" (string), "unique_sources" (object).
+"""
+
 
 class Planner:
     def __init__(self,
@@ -108,6 +135,15 @@ class Planner:
             **model_params['model_args']
         )
 
+        # Repairs of the plan are small text transformations, the (cheaper) language model is sufficient
+        model_params = llm_config['language_model']
+        self.repair_llm = init_chat_model(
+            model=model_params['model'],
+            model_provider=model_params['model_provider'],
+            api_key=model_params['api_key'],
+            **model_params['model_args']
+        )
+
 
     """
     def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
@@ -116,6 +152,8 @@ class Planner:
         return state
     """
 
+    @with_usage_ledger
+    @usage_scope(node=Node.PLANNER)
     def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
         """
         Generate a structured research plan by creating sections for a comprehensive report.
@@ -143,7 +181,8 @@ class Planner:
         Note:
             The method combines query generation, web search, and LLM-based planning
             to create a comprehensive research outline. It parses JSON output from
-            the reasoning model to extract structured section information.
+            the reasoning model to extract structured section information, repairing
+            it locally where possible (see parse_sections).
         """
 
         state = self.query_writer.run(state=state, config=config)
@@ -159,10 +198,52 @@ class Planner:
                                                    report_organization=configurable.report_structure,
                                                    context=state.source_str)
 
-        with get_usage_metadata_callback() as cb:
-            results = self.base_llm.invoke(instructions, response_format = {"type": "json_object"})
-            state.token_usage[self.model_name]['input_tokens'] += cb.usage_metadata[self.model_name]['input_tokens']
-            state.token_usage[self.model_name]['output_tokens'] += cb.usage_metadata[self.model_name]['output_tokens']
-        json_dict = json.loads(results.content)
-        state.sections = [Section(**s) for s in json_dict['sections']]
+        results = self.base_llm.invoke(instructions, response_format = {"type": "json_object"})
+        state.sections = self.parse_sections(text=results.content)
+        # After parsing, so that the repair calls are included
+        state.token_usage = get_usage_ledger().token_usage(models=[*state.token_usage.keys()])
         return state
+
+    def parse_sections(self, text: str) -> list[Section]:
+        """
+        Parse the sections of the report from the reasoning model output without re-running the reasoning model.
+
+        The output is repaired locally first (thinking tokens, malformed JSON, loosely typed fields).
+        If no plan can be recovered, the language model converts the whole output into JSON. Only the
+        section fragments that are still invalid are re-prompted individually; sections that cannot
+        be fixed are dropped.
+
+        Args:
+            text (str): Raw output of the reasoning model.
+
+        Returns:
+            list[Section]: Sections of the report.
+
+        Raises:
+            ValueError: If no valid section can be recovered.
+        """
+        json_dict = parse_json_object(text=text)
+        if json_dict is None or not isinstance(json_dict.get('sections'), list):
+            results = self.repair_llm.invoke(PLAN_REPAIR_INSTRUCTIONS.format(text=text), response_format = {"type": "json_object"})
+            json_dict = parse_json_object(text=results.content)
+            if json_dict is None or not isinstance(json_dict.get('sections'), list):
+                raise ValueError(f'Planner output does not contain a list of sections: {text[:200]!r}')
+
+        sections = []
+        for fragment in json_dict['sections']:
+            try:
+                sections.append(coerce_section(fragment))
+            except ValueError as e:
+                instructions = SECTION_REPAIR_INSTRUCTIONS.format(fragment=json.dumps(fragment), error=e)
+                results = self.repair_llm.invoke(instructions, response_format = {"type": "json_object"})
+                repaired = parse_json_object(text=results.content)
+                if isinstance(repaired, dict) and isinstance(repaired.get('sections'), list) and repaired['sections']:
+                    repaired = repaired['sections'][0]
+                try:
+                    sections.append(coerce_section(repaired))
+                except ValueError:
+                    continue
+
+        if not sections:
+            raise ValueError('Planner output does not contain any valid section')
+        return sections
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Callable, Optional
+
+from summary_writer import SummaryWriter
+
+from ..enums import Node
+from ..usage import BudgetExceededError, UsageLedger, usage_ledger, usage_scope
+
+# Warm SummaryWriter (LLM and web search clients) of the worker process, created once by init_worker
+_section_writer: Optional[SummaryWriter] = None
+# Event loop of the worker process, kept for all its sections: the async HTTP clients (cached by the
+# LLM integrations) keep connections bound to the loop they were opened in
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def init_worker(llm_config: dict[str, Any], web_search_api_key: str, setup: Optional[Callable[[], Any]] = None):
+    global _section_writer, _event_loop
+    if setup is not None:
+        setup()
+    _section_writer = SummaryWriter(llm_config=llm_config, web_search_api_key=web_search_api_key)
+    _event_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_event_loop)
+
+
+def ping() -> bool:
+    return _section_writer is not None
+
+
+def write_section(topic: str,
+                  section_name: str,
+                  config: dict[str, Any],
+                  prices: dict[str, dict[str, float]],
+                  max_cost_usd: Optional[float]) -> tuple[dict[str, Any] | Exception, dict]:
+    """
+    Research and write one section in a worker process.
+
+    The LLM calls of the section are recorded in a ledger local to the worker, whose entries are
+    returned with the result so that the parent process can merge them into the report ledger.
+    Exceptions are returned instead of raised, so that the tokens spent before a failure are
+    accounted as well. Other than BudgetExceededError, they are returned as RuntimeError: many LLM
+    client exceptions (e.g. openai.APIStatusError) cannot be unpickled in the parent process, which
+    would mark the whole process pool as broken.
+    """
+    ledger = UsageLedger(prices=prices, max_cost_usd=max_cost_usd)
+    with usage_ledger(ledger), usage_scope(node=Node.SECTIONS_WRITER, section=section_name, stop_on_budget=True):
+        try:
+            out = _event_loop.run_until_complete(_section_writer.run(topic=topic, config=config))
+        except BudgetExceededError as e:
+            out = e
+        except Exception as e:
+            out = RuntimeError(f'{type(e).__module__}.{type(e).__name__}: {e}')
+    return out, ledger.entries
@@ -1,51 +1,172 @@
 import asyncio
-from typing import Any, Final
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Final, Optional
 
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel
 from summary_writer import SummaryWriter
 
+from . import section_worker
 from ..enums import Node
-from ..state import section_template
+from ..state import Section, section_template
+from ..usage import BudgetExceededError, UsageLedger, get_usage_ledger, usage_scope, with_usage_ledger
 
 
 class SectionsWriter:
     def __init__(self,
                  llm_config: dict[str, Any],
                  web_search_api_key: str,
-                 configuration_module_prefix: str):
+                 configuration_module_prefix: str,
+                 max_workers: int = 0,
+                 worker_setup: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            llm_config: LLM configuration of the SummaryWriter.
+            web_search_api_key: Web search API key of the SummaryWriter.
+            configuration_module_prefix: Module prefix of the Configuration class.
+            max_workers: Number of worker processes for section research. With 0, all sections are
+                         researched concurrently in an event loop of the calling process.
+            worker_setup: Optional picklable callable run once in each worker process before its SummaryWriter is created.
+        """
         self.configuration_module_prefix: Final = configuration_module_prefix
         self.section_writer = SummaryWriter(
             llm_config=llm_config,
             web_search_api_key=web_search_api_key
         )
+        self.max_workers = max_workers
+        self.worker_args = (llm_config, web_search_api_key, worker_setup)
+        self.process_pool = None
+        self.pool_lock = threading.Lock()
+        if max_workers > 0:
+            self.process_pool = self.create_process_pool()
 
+    def create_process_pool(self) -> ProcessPoolExecutor:
+        # Workers are spawned (not forked) since the parent runs threads, and keep a warm SummaryWriter each
+        process_pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=section_worker.init_worker,
+            initargs=self.worker_args,
+        )
+        for future in [process_pool.submit(section_worker.ping) for _ in range(self.max_workers)]:
+            future.result()
+        return process_pool
+
+    def restart_process_pool(self, broken_pool: ProcessPoolExecutor):
+        """Replace a broken process pool (e.g. a worker was killed), once for all the reports using it."""
+        with self.pool_lock:
+            if self.process_pool is broken_pool:
+                broken_pool.shutdown(wait=False)
+                self.process_pool = self.create_process_pool()
+
+    def close(self):
+        """Shut down the worker processes (if any)."""
+        with self.pool_lock:
+            if self.process_pool is not None:
+                self.process_pool.shutdown()
+                self.process_pool = None
+
+    @with_usage_ledger
     def run(self, state: BaseModel, config: RunnableConfig) -> BaseModel:
 
-        event_loop = asyncio.new_event_loop()
-        tasks = [
-            self.section_writer.run(
+        ledger = get_usage_ledger()
+        research_idx = [idx for (idx, section) in enumerate(state.sections) if section.research]
+
+        if ledger.budget_exceeded:
+            out_list = [BudgetExceededError()] * len(research_idx)
+        elif self.process_pool is not None:
+            out_list = self.run_in_workers(topic=state.topic, sections=[state.sections[idx] for idx in research_idx],
+                                           config=config, ledger=ledger)
+        else:
+            event_loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(event_loop)
+            tasks = [
+                self.write_section(topic=state.topic, section=state.sections[idx], config=config) for idx in research_idx
+            ]
+
+            # out_list = await asyncio.gather(*tasks)
+            out_list = event_loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            event_loop.close()
+            asyncio.set_event_loop(None)
+        state.steps.append(Node.SECTIONS_WRITER)
+
+        for (idx, s) in enumerate(out_list):
+            if isinstance(s, BudgetExceededError):
+                # Research stopped by the cost budget: the section is written by the FinalWriter from the planner context
+                state.sections[research_idx[idx]].budget_stopped = True
+            elif isinstance(s, BaseException):
+                raise s
+            else:
+                state.sections[research_idx[idx]].content = s['content']
+                state.sections[research_idx[idx]].unique_sources = s['unique_sources']
+
+        state.token_usage = ledger.token_usage(models=[*state.token_usage.keys()])
+        return state
+
+    async def write_section(self, topic: str, section: Section, config: RunnableConfig) -> dict[str, Any]:
+        with usage_scope(node=Node.SECTIONS_WRITER, section=section.name, stop_on_budget=True):
+            return await self.section_writer.run(
                 topic=section_template.format(
-                    topic=state.topic, section_title=section.name, section_description=section.description
+                    topic=topic, section_title=section.name, section_description=section.description
                 ),
                 config=config
-            ) for section in state.sections if section.research
-        ]
+            )
 
-        # out_list = await asyncio.gather(*tasks)
-        out_list = event_loop.run_until_complete(asyncio.gather(*tasks))
-        event_loop.close()
-        state.steps.append(Node.SECTIONS_WRITER)
+    def run_in_workers(self, topic: str, sections: list[Section], config: RunnableConfig, ledger: UsageLedger) -> list[Any]:
+        """
+        Research the sections in the worker processes.
 
-        models_list = [*state.token_usage.keys()]
-        research_idx = [idx for (idx, section) in enumerate(state.sections) if section.research]
+        Results are returned in the order of `sections` and the usage of each section is merged into
+        the report ledger. Worker processes cannot see the report ledger, hence the remaining budget
+        is shared equally between the sections. If the process pool is broken, it is replaced and the
+        sections affected fail with BrokenProcessPool.
+        """
+        max_cost_usd = None
+        if ledger.max_cost_usd is not None and sections:
+            max_cost_usd = (ledger.max_cost_usd - ledger.cost_usd) / len(sections)
 
-        for (idx, s) in enumerate(out_list):
-            state.sections[research_idx[idx]].content = s['content']
-            state.sections[research_idx[idx]].unique_sources = s['unique_sources']
+        # Only the user configuration: callbacks, checkpointer etc. of the graph run cannot be pickled
+        worker_config = {
+            'configurable': {
+                k: v for k, v in config['configurable'].items() if not k.startswith(('__pregel_', 'checkpoint_'))
+            }
+        }
 
-            for m in models_list:
-                state.token_usage[m]['input_tokens'] += s['token_usage'][m]['input_tokens']
-                state.token_usage[m]['output_tokens'] += s['token_usage'][m]['output_tokens']
+        def submit(process_pool: ProcessPoolExecutor) -> list[Future]:
+            return [
+                process_pool.submit(
+                    section_worker.write_section,
+                    topic=section_template.format(
+                        topic=topic, section_title=section.name, section_description=section.description
+                    ),
+                    section_name=section.name,
+                    config=worker_config,
+                    prices=ledger.prices,
+                    max_cost_usd=max_cost_usd,
+                ) for section in sections
+            ]
 
-        return state
+        process_pool = self.process_pool
+        try:
+            futures = submit(process_pool)
+        except BrokenProcessPool:
+            # Broken since a previous report
+            self.restart_process_pool(broken_pool=process_pool)
+            process_pool = self.process_pool
+            futures = submit(process_pool)
+
+        out_list = []
+        for future in futures:
+            try:
+                s, entries = future.result()
+                ledger.merge(entries=entries)
+            except BrokenProcessPool as e:
+                self.restart_process_pool(broken_pool=process_pool)
+                s = e
+            except Exception as e:
+                s = e
+            out_list.append(s)
+        return out_list
@@ -19,6 +19,7 @@ DEFAULT_REPORT_STRUCTURE = """The report structure should focus on breaking-down
 
 class Configuration(CfgBase):
     """The configurable fields for the workflow"""
+    max_cost_usd: float | None = None
     max_iterations: int
     max_results_per_query: int
     max_tokens_per_source: int
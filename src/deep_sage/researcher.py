@@ -1,21 +1,32 @@
 from uuid import uuid4
-from typing import Any, Final
+from typing import Any, Callable, Final, Optional
 from langgraph.graph import START, END, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.runnables import RunnableConfig
 
-from ai_common import GraphBase
+from ai_common import GraphBase, PRICE_USD_PER_MILLION_TOKENS, get_config_from_runnable
 
+from .checkpoint import ContentAddressedMemorySaver
 from .configuration import Configuration
 from .enums import Node
 from .state import ReportState
+from .usage import UsageLedger, estimate_usage, usage_ledger
 from .components import Planner, SectionsWriter, FinalWriter, Finalizer
 
 
 class Researcher(GraphBase):
-    def __init__(self, llm_config: dict[str, Any], web_search_api_key: str):
-        self.memory_saver = MemorySaver()
+    def __init__(self,
+                 llm_config: dict[str, Any],
+                 web_search_api_key: str,
+                 section_workers: int = 0,
+                 section_worker_setup: Optional[Callable[[], Any]] = None):
+        self.memory_saver = ContentAddressedMemorySaver()
         self.models = list({llm_config['language_model']['model'], llm_config['reasoning_model']['model']})
+        self.language_model = llm_config['language_model']['model']
+        self.reasoning_model = llm_config['reasoning_model']['model']
+        self.prices = {
+            params['model']: PRICE_USD_PER_MILLION_TOKENS.get(params['model_provider'], {}).get(params['model'], {})
+            for params in (llm_config['language_model'], llm_config['reasoning_model'])
+        }
         self.configuration_module_prefix: Final = 'src.deep_sage.configuration'
 
         self.planner = Planner(
@@ -27,6 +38,8 @@ class Researcher(GraphBase):
             llm_config=llm_config,
             web_search_api_key=web_search_api_key,
             configuration_module_prefix=self.configuration_module_prefix,
+            max_workers=section_workers,
+            worker_setup=section_worker_setup,
         )
         self.final_writer = FinalWriter(
             model_params = llm_config['language_model'],
@@ -36,6 +49,16 @@ class Researcher(GraphBase):
 
         self.graph = self.build_graph()
 
+    def close(self):
+        """Release the resources of the Researcher (the section worker processes)."""
+        self.sections_writer.close()
+
+    def __enter__(self) -> 'Researcher':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def run(self, topic: str, config: RunnableConfig) -> dict[str, Any]:
         in_state = ReportState(
             content='',
@@ -49,11 +72,54 @@ class Researcher(GraphBase):
             topic=topic,
             unique_sources={},
         )
-        out_state = self.graph.invoke(in_state, config)
+        configurable = get_config_from_runnable(
+            configuration_module_prefix = self.configuration_module_prefix,
+            config = config
+        )
+        if configurable.max_cost_usd is not None and (unpriced := [m for m, p in self.prices.items() if not p]):
+            # Calls of a model without prices cost 0, the budget would never be reached
+            raise ValueError(f'max_cost_usd is set but there are no prices for the models: {unpriced}')
+        ledger = UsageLedger(prices=self.prices, max_cost_usd=configurable.max_cost_usd)
+        try:
+            with usage_ledger(ledger):
+                out_state = self.graph.invoke(in_state, config)
+        finally:
+            # Checkpoints of a report are not read after its run, free them together with their blobs
+            if (thread_id := config.get('configurable', {}).get('thread_id')) is not None:
+                self.memory_saver.delete_thread(thread_id)
         out_dict = {
             'content': out_state['content'],
             'unique_sources': out_state['unique_sources'],
             'token_usage': out_state['token_usage'],
+            'usage': ledger.summary(),
+        }
+        return out_dict
+
+    def estimate_cost(self, config: RunnableConfig, number_of_sections: int = 5) -> dict[str, Any]:
+        """
+        Estimate the token usage and cost of a report before running it.
+
+        Args:
+            config (RunnableConfig): The runnable configuration of the report.
+            number_of_sections (int): Expected number of sections in the plan (including introduction and conclusion).
+
+        Returns:
+            dict[str, Any]: Estimated 'token_usage' per model and total 'cost_usd' (an upper bound).
+        """
+        configurable = get_config_from_runnable(
+            configuration_module_prefix = self.configuration_module_prefix,
+            config = config
+        )
+        token_usage = estimate_usage(
+            configurable = configurable,
+            language_model = self.language_model,
+            reasoning_model = self.reasoning_model,
+            number_of_sections = number_of_sections,
+        )
+        ledger = UsageLedger(prices=self.prices)
+        out_dict = {
+            'token_usage': token_usage,
+            'cost_usd': sum([ledger.entry_cost(model=m, usage=u) for m, u in token_usage.items()]),
         }
         return out_dict
 
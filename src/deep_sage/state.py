@@ -27,6 +27,10 @@ class Section(BaseModel):
     unique_sources: dict[str, Any] = Field(
         description="Unique sources for this section."
     )
+    budget_stopped: bool = Field(
+        default=False,
+        description="Whether the research of this section was stopped by the cost budget."
+    )
 
 class Sections(BaseModel):
     sections: List[Section] = Field(description="Sections of the report.")
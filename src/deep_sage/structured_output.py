@@ -0,0 +1,181 @@
+import json
+import re
+from typing import Any
+
+from pydantic import ValidationError
+
+from .state import Section
+
+THINK_BLOCK = re.compile(r'<think>.*?</think>', flags=re.DOTALL)
+CODE_FENCE = re.compile(r'```(?:json)?', flags=re.IGNORECASE)
+LITERALS = {'true': 'true', 'false': 'false', 'null': 'null', 'True': 'true', 'False': 'false', 'None': 'null'}
+TRUE_WORDS = {'yes', 'y', 'true', 't', '1', 'required', 'needed'}
+FALSE_WORDS = {'no', 'n', 'false', 'f', '0', 'none', 'not required', 'not needed'}
+MAX_CANDIDATES = 20
+
+
+def strip_thinking_tokens(text: str) -> str:
+    """Remove <think>...</think> blocks (and an unterminated leading thinking block) from model output."""
+    text = THINK_BLOCK.sub('', text)
+    if '</think>' in text:
+        text = text.split('</think>')[-1]
+    return text.strip()
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix common JSON faults of LLM output in a single pass.
+
+    Outside of string literals: unquoted keys and bare words are quoted, Python literals are
+    converted, single-quoted strings become double-quoted, missing commas between values are
+    inserted, trailing commas are removed and unclosed brackets (truncated output) are closed.
+    Inside string literals, raw control characters are escaped.
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    i, n = 0, len(text)
+
+    def last() -> str:
+        for token in reversed(out):
+            if token.strip():
+                return token.strip()[-1]
+        return ''
+
+    def start_value():
+        prev = last()
+        if prev and (prev in '"}]' or prev.isalnum()):
+            out.append(',')
+
+    def number_end(start: int) -> int:
+        k = start + 1
+        while k < n and text[k] in '0123456789.eE+-':
+            k += 1
+        return k
+
+    def drop_trailing_comma():
+        while out and not out[-1].strip():
+            out.pop()
+        if out and out[-1] == ',':
+            out.pop()
+
+    while i < n:
+        c = text[i]
+        if c in '"\'':
+            j, chars = i + 1, []
+            while j < n and text[j] != c:
+                if text[j] == '\\' and j + 1 < n:
+                    chars.append(text[j:j + 2])
+                    j += 2
+                else:
+                    chars.append(text[j])
+                    j += 1
+            raw = ''.join(chars)
+            if c == '\'':
+                raw = raw.replace('\\\'', '\'').replace('"', '\\"')
+            raw = raw.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+            start_value()
+            out.append(f'"{raw}"')
+            i = j + 1
+        elif c in '{[':
+            start_value()
+            stack.append(c)
+            out.append(c)
+            i += 1
+        elif c in '}]':
+            drop_trailing_comma()
+            if stack:
+                stack.pop()
+            out.append(c)
+            i += 1
+        elif c.isalpha() or c == '_' or (c.isdigit() and (k := number_end(i)) < n and (text[k].isalpha() or text[k] == '_')):
+            # Bare words run until a delimiter, apostrophes inside words (don't, it's) are kept.
+            # Numbers followed by letters (3D printing) are bare words as well.
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in '_ -' or
+                             (text[j] == '\'' and text[j - 1].isalnum() and j + 1 < n and text[j + 1].isalnum())):
+                j += 1
+            word = text[i:j].strip()
+            i = i + len(text[i:j].rstrip())
+            start_value()
+            out.append(LITERALS.get(word, json.dumps(word)))
+        elif c in '-0123456789':
+            j = number_end(i)
+            start_value()
+            out.append(text[i:j])
+            i = j
+        else:
+            out.append(c)
+            i += 1
+
+    drop_trailing_comma()
+    if last() == ':':
+        out.append('null')
+    out.extend('}' if s == '{' else ']' for s in reversed(stack))
+    return ''.join(out)
+
+
+def parse_json_object(text: str) -> dict[str, Any] | None:
+    """
+    Extract a JSON object from LLM output, repairing it if needed.
+
+    Thinking content is always ignored: a draft plan inside <think> must not be taken for the answer.
+    Each '{' is a candidate start: the first complete JSON value from there is decoded (so text
+    after the object, including braces, is ignored), otherwise the rest of the text is repaired and
+    decoded. Objects with a 'sections' field are preferred. Returns None if no object can be recovered.
+    """
+    text = CODE_FENCE.sub('', strip_thinking_tokens(text))
+
+    decoder = json.JSONDecoder()
+    first_dict = None
+    starts = [m.start() for m in re.finditer(r'\{', text)][:MAX_CANDIDATES]
+    for start in starts:
+        try:
+            obj, _ = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            try:
+                obj, _ = decoder.raw_decode(repair_json(text[start:]))
+            except json.JSONDecodeError:
+                continue
+        if isinstance(obj, dict):
+            if 'sections' in obj:
+                return obj
+            first_dict = first_dict or obj
+    return first_dict
+
+
+def coerce_section(fragment: Any) -> Section:
+    """
+    Build a Section from a (possibly sloppy) section fragment.
+
+    Keys are matched case-insensitively ('Unique Sources' -> unique_sources), research answers such as
+    'yes' / 'No.' are converted to booleans and missing content / sources are left blank.
+
+    Raises:
+        ValueError: If the fragment is not a section (e.g. missing name or description).
+    """
+    if not isinstance(fragment, dict):
+        raise ValueError(f'Section must be a JSON object, got {type(fragment).__name__}')
+    data = {re.sub(r'[\s\-]+', '_', str(k).strip().lower()): v for k, v in fragment.items()}
+
+    research = data.get('research')
+    if isinstance(research, str):
+        answer = research.strip().strip('.!').lower()
+        if answer in TRUE_WORDS:
+            research = True
+        elif answer in FALSE_WORDS:
+            research = False
+        else:
+            raise ValueError(f'Invalid research value: {research!r}')
+
+    content = data.get('content')
+    unique_sources = data.get('unique_sources')
+    try:
+        return Section(
+            name=data.get('name'),
+            description=data.get('description'),
+            research=research,
+            content=content if isinstance(content, str) else '',
+            unique_sources=unique_sources if isinstance(unique_sources, dict) else {},
+        )
+    except ValidationError as e:
+        raise ValueError(str(e)) from e
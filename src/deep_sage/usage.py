@@ -0,0 +1,274 @@
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from pydantic import BaseModel, ConfigDict
+
+from .configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+USAGE_KEYS = ('input_tokens', 'output_tokens', 'cache_read', 'cache_creation', 'reasoning')
+
+# Rough per-call token counts used by the pre-run cost estimate
+PROMPT_TOKENS = 1000
+QUERY_TOKENS = 50
+PLAN_TOKENS = 2500
+SECTION_TOKENS = 1500
+REFLECTION_TOKENS = 1000
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised for an LLM call that would start after the report cost reached `max_cost_usd`."""
+
+
+class _BudgetStopFilter(logging.Filter):
+    """Drop the callback error warning of LangChain for LLM calls refused by the budget (an expected stop)."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not (record.msg == 'Error in %s.%s callback: %s' and
+                    isinstance(record.args, tuple) and len(record.args) == 3 and
+                    record.args[0] == 'UsageLedger' and record.args[2].startswith('BudgetExceededError('))
+
+
+class UsageScope(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    node: str = ''
+    section: str = ''
+    stop_on_budget: bool = False
+
+
+class UsageLedger(BaseCallbackHandler):
+    """
+    Central token usage and cost ledger of a report.
+
+    The ledger is registered as a LangChain callback handler (see `usage_ledger`), so every LLM call
+    made during the report is recorded as soon as it ends, broken down per node, per section and
+    per model. Calls made in a scope with `stop_on_budget` are refused with BudgetExceededError once
+    the accumulated cost reaches `max_cost_usd`.
+
+    Args:
+        prices: USD per million tokens for each model, keyed by usage key (e.g. 'input_tokens').
+        max_cost_usd: Budget of the report. None for no limit.
+    """
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, prices: dict[str, dict[str, float]], max_cost_usd: Optional[float] = None):
+        super().__init__()
+        self.prices = prices
+        self.max_cost_usd = max_cost_usd
+        self.entries: dict[tuple[str, str, str], dict[str, int]] = {}  # (node, section, model) -> usage
+        self._lock = threading.Lock()
+        self._scopes: dict[UUID, UsageScope] = {}
+
+    @property
+    def cost_usd(self) -> float:
+        with self._lock:
+            entries = list(self.entries.items())
+        return sum(self.entry_cost(model=model, usage=usage) for (_, _, model), usage in entries)
+
+    @property
+    def budget_exceeded(self) -> bool:
+        return self.max_cost_usd is not None and self.cost_usd >= self.max_cost_usd
+
+    def entry_cost(self, model: str, usage: dict[str, int]) -> float:
+        price_dict = self.prices.get(model, {})
+        return sum([price_dict[k] * usage.get(k, 0) for k in price_dict.keys()]) / 1e6
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id=run_id)
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id=run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        scope = self._scopes.pop(run_id, None) or _current_scope.get()
+        try:
+            generation = response.generations[0][0]
+        except IndexError:
+            return
+        if isinstance(generation, ChatGeneration) and isinstance(generation.message, AIMessage):
+            message = generation.message
+            if message.usage_metadata and (model_name := message.response_metadata.get('model_name')):
+                self.record(model=model_name, usage_metadata=message.usage_metadata, scope=scope)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._scopes.pop(run_id, None)
+
+    def record(self, model: str, usage_metadata: dict[str, Any], scope: UsageScope) -> None:
+        input_details = usage_metadata.get('input_token_details') or {}
+        output_details = usage_metadata.get('output_token_details') or {}
+        with self._lock:
+            usage = self.entries.setdefault((scope.node, scope.section, model), dict.fromkeys(USAGE_KEYS, 0) | {'calls': 0})
+            usage['input_tokens'] += usage_metadata.get('input_tokens', 0)
+            usage['output_tokens'] += usage_metadata.get('output_tokens', 0)
+            usage['cache_read'] += input_details.get('cache_read', 0)
+            usage['cache_creation'] += input_details.get('cache_creation', 0)
+            usage['reasoning'] += output_details.get('reasoning', 0)
+            usage['calls'] += 1
+
+    def merge(self, entries: dict[tuple[str, str, str], dict[str, int]]) -> None:
+        """Add the entries of another ledger (e.g. of a worker process)."""
+        with self._lock:
+            for key, usage in entries.items():
+                totals = self.entries.setdefault(key, dict.fromkeys(USAGE_KEYS, 0) | {'calls': 0})
+                for k, v in usage.items():
+                    totals[k] += v
+
+    def token_usage(self, models: list[str]) -> dict[str, dict[str, int]]:
+        """Input and output tokens per model, in the format of ReportState.token_usage"""
+        by_model = self.by_model()
+        return {
+            m: {k: by_model.get(m, {}).get(k, 0) for k in ('input_tokens', 'output_tokens')}
+            for m in {*models, *by_model.keys()}
+        }
+
+    def by_model(self) -> dict[str, dict[str, Any]]:
+        return self._aggregate(index=2)
+
+    def by_node(self) -> dict[str, dict[str, Any]]:
+        return self._aggregate(index=0)
+
+    def by_section(self) -> dict[str, dict[str, Any]]:
+        out_dict = self._aggregate(index=1)
+        out_dict.pop('', None)
+        return out_dict
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'cost_usd': self.cost_usd,
+            'max_cost_usd': self.max_cost_usd,
+            'budget_exceeded': self.budget_exceeded,
+            'by_model': self.by_model(),
+            'by_node': self.by_node(),
+            'by_section': self.by_section(),
+        }
+
+    def _aggregate(self, index: int) -> dict[str, dict[str, Any]]:
+        out_dict = {}
+        with self._lock:
+            entries = list(self.entries.items())
+        for key, usage in entries:
+            totals = out_dict.setdefault(key[index], dict.fromkeys([*USAGE_KEYS, 'calls'], 0) | {'cost_usd': 0.0})
+            for k, v in usage.items():
+                totals[k] += v
+            totals['cost_usd'] += self.entry_cost(model=key[2], usage=usage)
+        return out_dict
+
+    def _start(self, run_id: UUID) -> None:
+        scope = _current_scope.get()
+        if scope.stop_on_budget and self.budget_exceeded:
+            message = f'Report cost {self.cost_usd:.4f} USD reached max_cost_usd ({self.max_cost_usd:.4f} USD)'
+            logger.info('LLM call of %s stopped by the budget: %s', scope.section or scope.node, message)
+            raise BudgetExceededError(message)
+        self._scopes[run_id] = scope
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar('deep_sage_usage_ledger', default=None)
+_current_scope: ContextVar[UsageScope] = ContextVar('deep_sage_usage_scope', default=UsageScope())
+register_configure_hook(_current_ledger, inheritable=True)
+logging.getLogger('langchain_core.callbacks.manager').addFilter(_BudgetStopFilter())
+
+
+@contextmanager
+def usage_ledger(ledger: UsageLedger) -> Iterator[UsageLedger]:
+    """Record all LLM calls made in the context (including spawned threads and tasks) in the ledger."""
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+@contextmanager
+def usage_scope(node: Optional[str] = None, section: Optional[str] = None, stop_on_budget: Optional[bool] = None) -> Iterator[UsageScope]:
+    """Attribute the LLM calls made in the context to the given node / section. Unset values are inherited."""
+    parent = _current_scope.get()
+    scope = UsageScope(
+        node=parent.node if node is None else node,
+        section=parent.section if section is None else section,
+        stop_on_budget=parent.stop_on_budget if stop_on_budget is None else stop_on_budget,
+    )
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def get_usage_ledger() -> Optional[UsageLedger]:
+    """Ledger of the current report, None outside of `usage_ledger` (see `with_usage_ledger`)."""
+    return _current_ledger.get()
+
+
+def with_usage_ledger(run: Callable[..., BaseModel]) -> Callable[..., BaseModel]:
+    """
+    Decorator for the `run(state, config)` method of a component, guaranteeing a ledger in `get_usage_ledger`.
+
+    The report ledger is used if one is active. Otherwise (e.g. a component run outside of
+    Researcher.run), the calls are recorded in a local ledger seeded with the token usage of the
+    state so that `token_usage` stays cumulative. The local ledger has no prices, hence no budget:
+    `max_cost_usd` is only enforced by Researcher.run (not by invoking the graph directly).
+    """
+    @functools.wraps(run)
+    def wrapper(self, state: BaseModel, config: Any) -> BaseModel:
+        if _current_ledger.get() is not None:
+            return run(self, state, config)
+        ledger = UsageLedger(prices={})
+        ledger.merge(entries={('', '', model): usage for model, usage in state.token_usage.items()})
+        with usage_ledger(ledger):
+            return run(self, state, config)
+    return wrapper
+
+
+def estimate_usage(configurable: Configuration,
+                   language_model: str,
+                   reasoning_model: str,
+                   number_of_sections: int) -> dict[str, dict[str, int]]:
+    """
+    Coarse upper bound of the token usage of a report, computed before the run.
+
+    Source contexts are assumed to be full (number_of_queries * max_results_per_query sources of
+    max_tokens_per_source tokens each) and section research is assumed to run for max_iterations.
+    Introduction and conclusion are the sections without research.
+    """
+    sections_cfg = configurable.sections_config.get('configurable', {})
+    section_queries = sections_cfg.get('number_of_queries', configurable.number_of_queries)
+    section_results = sections_cfg.get('max_results_per_query', configurable.max_results_per_query)
+    section_source_tokens = sections_cfg.get('max_tokens_per_source', configurable.max_tokens_per_source)
+    section_iterations = sections_cfg.get('max_iterations', configurable.max_iterations)
+    number_of_research_sections = max(number_of_sections - 2, 0)
+
+    usage = {m: {'input_tokens': 0, 'output_tokens': 0} for m in (language_model, reasoning_model)}
+
+    def add(model: str, input_tokens: int, output_tokens: int, calls: int = 1):
+        usage[model]['input_tokens'] += int(input_tokens * calls)
+        usage[model]['output_tokens'] += int(output_tokens * calls)
+
+    # Planner: query writing + planning over the search results
+    planner_context = configurable.number_of_queries * configurable.max_results_per_query * configurable.max_tokens_per_source
+    add(language_model, PROMPT_TOKENS, QUERY_TOKENS * configurable.number_of_queries)
+    add(reasoning_model, PROMPT_TOKENS + planner_context, PLAN_TOKENS)
+
+    # Sections Writer: query writing, summarizing and reflection per iteration of each research section
+    section_context = section_queries * section_results * section_source_tokens
+    calls = number_of_research_sections * section_iterations
+    add(language_model, PROMPT_TOKENS + SECTION_TOKENS, QUERY_TOKENS * section_queries, calls=calls)
+    add(language_model, PROMPT_TOKENS + SECTION_TOKENS + section_context, SECTION_TOKENS, calls=calls)
+    add(reasoning_model, PROMPT_TOKENS + SECTION_TOKENS, REFLECTION_TOKENS, calls=calls)
+
+    # Final Writer: non-research sections + report title
+    add(language_model, PROMPT_TOKENS + number_of_research_sections * SECTION_TOKENS, SECTION_TOKENS,
+        calls=number_of_sections - number_of_research_sections)
+    add(language_model, PROMPT_TOKENS + number_of_sections * SECTION_TOKENS, QUERY_TOKENS)
+
+    return usage
@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from uuid import uuid4
+
+import httpx
+import requests
+import tavily
+
+LLM_MODEL = 'fake-llm'
+REASONING_MODEL = 'fake-reasoning-llm'
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris. ')
+
+
+class FaultProfile:
+    """Latency, error rate and rate limit of a fake server."""
+    def __init__(self, latency: float, jitter: float, error_rate: float, rate_limit: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # Requests per second, 0 for no limit
+        self._lock = threading.Lock()
+        self._tokens = rate_limit
+        self._last = time.monotonic()
+
+    def admit(self) -> bool:
+        """Token bucket admission for the rate limit."""
+        if self.rate_limit <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._last) * self.rate_limit)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def wait(self):
+        time.sleep(max(0.0, random.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter))))
+
+
+def fake_from_schema(schema: dict[str, Any], defs: dict[str, Any], name: str = '') -> Any:
+    """Generate a value that satisfies a (simple) JSON schema."""
+    if '$ref' in schema:
+        return fake_from_schema(defs[schema['$ref'].split('/')[-1]], defs, name)
+    if 'anyOf' in schema:
+        return fake_from_schema(schema['anyOf'][0], defs, name)
+    if 'enum' in schema:
+        return schema['enum'][0]
+    match schema.get('type'):
+        case 'object':
+            return {k: fake_from_schema(v, defs, k) for k, v in schema.get('properties', {}).items()}
+        case 'array':
+            return [fake_from_schema(schema.get('items', {}), defs, name) for _ in range(3)]
+        case 'integer' | 'number':
+            return 1
+        case 'boolean':
+            return False
+        case _:
+            return f'fake {name} {uuid4().hex[:8]}'
+
+
+def fake_plan(number_of_sections: int) -> str:
+    sections = [
+        {
+            'name': f'Section {i}',
+            'description': f'Description of section {i}',
+            'research': 'yes' if 0 < i < number_of_sections - 1 else 'no',
+            'content': '',
+            'unique_sources': {},
+        } for i in range(number_of_sections)
+    ]
+    return json.dumps({'sections': sections})
+
+
+def llm_response(body: dict[str, Any], number_of_sections: int, completion_tokens: int) -> dict[str, Any]:
+    """OpenAI compatible chat completion for the request body."""
+    prompt = json.dumps(body.get('messages', []))
+    message: dict[str, Any] = {'role': 'assistant', 'content': None}
+    response_format = body.get('response_format') or {}
+
+    if body.get('tools'):
+        function = body['tools'][0]['function']
+        schema = function.get('parameters', {})
+        message['tool_calls'] = [{
+            'id': f'call_{uuid4().hex[:8]}',
+            'type': 'function',
+            'function': {'name': function['name'], 'arguments': json.dumps(fake_from_schema(schema, schema.get('$defs', {})))},
+        }]
+    elif response_format.get('type') == 'json_schema':
+        schema = response_format['json_schema']['schema']
+        message['content'] = json.dumps(fake_from_schema(schema, schema.get('$defs', {})))
+    elif 'report organization' in prompt:
+        message['content'] = fake_plan(number_of_sections=number_of_sections)
+    elif response_format.get('type') == 'json_object':
+        message['content'] = json.dumps({'queries': [f'fake query {i}' for i in range(3)]})
+    else:
+        message['content'] = (LOREM * (completion_tokens // 25 + 1))[:completion_tokens * 4]
+
+    prompt_tokens = len(prompt) // 4
+    return {
+        'id': f'chatcmpl-{uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', LLM_MODEL),
+        'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if body.get('tools') else 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def search_response(body: dict[str, Any], results_per_query: int, source_chars: int) -> dict[str, Any]:
+    query = body.get('query', '')
+    results = [
+        {
+            'title': f'{query} result {i}',
+            'url': f'https://example.com/{uuid4().hex}',
+            'content': LOREM[:200],
+            'raw_content': (LOREM * (source_chars // len(LOREM) + 1))[:source_chars],
+            'score': 1.0 - i / 10,
+        } for i in range(body.get('max_results', results_per_query))
+    ]
+    return {'query': query, 'follow_up_questions': None, 'answer': None, 'images': [], 'results': results, 'response_time': 0.1}
+
+
+def serve(kind: str, profile_args: dict[str, float], params: dict[str, Any], port_queue: multiprocessing.Queue):
+    """Run a fake LLM ('llm') or web search ('search') server until the process is terminated."""
+    profile = FaultProfile(**profile_args)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status: int, payload: dict[str, Any], headers: dict[str, str] | None = None):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not profile.admit():
+                self.send(429, {'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit'}}, {'retry-after-ms': '500'})
+                return
+            profile.wait()
+            if random.random() < profile.error_rate:
+                self.send(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            elif kind == 'llm':
+                self.send(200, llm_response(body, params['number_of_sections'], params['completion_tokens']))
+            else:
+                self.send(200, search_response(body, params['results_per_query'], params['source_chars']))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(kind: str, profile_args: dict[str, float], params: dict[str, Any]) -> tuple[multiprocessing.Process, str]:
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(kind, profile_args, params, port_queue), daemon=True)
+    process.start()
+    return process, f'http://127.0.0.1:{port_queue.get(timeout=30)}'
+
+
+def redirect_web_search(search_url: str):
+    """Send the Tavily client searches of this process (or of a section worker process) to the fake search server."""
+
+    def search(self, query: str, **kwargs) -> dict[str, Any]:
+        response = requests.post(search_url, data=json.dumps({'query': query, **kwargs}, default=str), timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    async def async_search(self, query: str, **kwargs) -> dict[str, Any]:
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(search_url, content=json.dumps({'query': query, **kwargs}, default=str))
+        response.raise_for_status()
+        return response.json()
+
+    tavily.TavilyClient.search = search
+    tavily.AsyncTavilyClient.search = async_search
+
+
+def fake_llm_config(llm_url: str, max_retries: int = 5) -> dict[str, Any]:
+    """LLM configuration of the Researcher for the fake LLM server."""
+    model_args = {'temperature': 0, 'max_retries': max_retries, 'max_tokens': 32768, 'base_url': f'{llm_url}/v1'}
+    return {
+        'language_model': {'model': LLM_MODEL, 'model_provider': 'openai', 'api_key': 'fake', 'model_args': model_args},
+        'reasoning_model': {'model': REASONING_MODEL, 'model_provider': 'openai', 'api_key': 'fake', 'model_args': model_args},
+    }
+
+
+def report_config() -> dict[str, Any]:
+    search_config = {
+        'max_iterations': 2,
+        'max_results_per_query': 3,
+        'max_tokens_per_source': 5000,
+        'number_of_days_back': 1e6,
+        'number_of_queries': 3,
+        'search_category': 'general',
+        'strip_thinking_tokens': True,
+    }
+    return {'configurable': {**search_config, 'sections_config': {'configurable': dict(search_config)}}}
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import gc
+import json
+import os
+import resource
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+from uuid import uuid4
+
+from src.deep_sage import Researcher
+from src.fake_servers import fake_llm_config, redirect_web_search, report_config, start_server
+
+
+class LagProbeEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop measuring its own lag while it runs a report step.
+
+    A probe task sleeps `interval` seconds in a row, the lag is the overshoot of each sleep: how long
+    ready callbacks wait behind the other callbacks of the loop, the GIL and the CPU. The lags are
+    collected by the active ProcessMonitor.
+    """
+    interval = 0.01
+    lags: Optional[list[float]] = None
+
+    def run_until_complete(self, future):
+        lags = LagProbeEventLoop.lags
+        if lags is None:
+            return super().run_until_complete(future)
+        future = asyncio.ensure_future(future, loop=self)
+        probe = self.create_task(self._probe(future=future, lags=lags))
+        try:
+            return super().run_until_complete(future)
+        finally:
+            probe.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                super().run_until_complete(probe)
+
+    async def _probe(self, future: asyncio.Future, lags: list[float]):
+        while not future.done():
+            t1 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lags.append(time.perf_counter() - t1 - self.interval)
+
+
+def probe_report_loops():
+    """Create the event loops of the SectionsWriter and the FinalWriter (asyncio.new_event_loop) as LagProbeEventLoop."""
+    asyncio.new_event_loop = LagProbeEventLoop
+
+
+class ProcessMonitor:
+    """
+    Samples RSS and collects the event loop lag of the reports in the background.
+
+    RSS is the sum over this process and its child processes (section workers), except `exclude_pids`
+    (e.g. the fake servers). Loop lags are measured in the report loops of this process (see
+    LagProbeEventLoop), not in the loops of the section worker processes.
+    """
+    def __init__(self, interval: float = 0.1, exclude_pids: Iterable[int] = ()):
+        self.interval = interval
+        self.exclude_pids = set(exclude_pids)
+        self.lags: list[float] = []
+        self.start_rss = self.rss()
+        self.peak_rss = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        LagProbeEventLoop.lags = self.lags
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        LagProbeEventLoop.lags = None
+        self._stop.set()
+        self._thread.join()
+
+    def rss(self) -> int:
+        try:
+            return sum(self.process_rss(pid) for pid in [os.getpid(), *self.child_pids()])
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @staticmethod
+    def process_rss(pid: int) -> int:
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (FileNotFoundError, ProcessLookupError):
+            return 0  # Exited in the meantime
+
+    def child_pids(self) -> list[int]:
+        pid, children = os.getpid(), []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit() or int(entry) in self.exclude_pids:
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+            if ppid == pid:
+                children.append(int(entry))
+        return children
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.rss())
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else float('nan')
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def run_level(make_researcher: Callable[[], Researcher], config: dict[str, Any], concurrency: int, reports_per_worker: int,
+              exclude_pids: Iterable[int] = ()) -> dict[str, Any]:
+    """
+    Run `concurrency` workers, each generating `reports_per_worker` reports one after the other.
+
+    Each level uses a new Researcher, so that checkpoints (and section worker processes) of the
+    previous levels are not carried over. The RSS increase is relative to the start of the level.
+    `exclude_pids` are child processes not counted in RSS (the fake servers).
+    """
+    latencies, failures = [], []
+    gc.collect()
+    researcher = make_researcher()
+
+    def worker(worker_idx: int):
+        for report_idx in range(reports_per_worker):
+            report_config = {'configurable': {**config['configurable'], 'thread_id': str(uuid4())}}
+            t1 = time.perf_counter()
+            try:
+                researcher.run(topic=f'Load test topic {worker_idx}-{report_idx}', config=report_config)
+                latencies.append(time.perf_counter() - t1)
+            except Exception as e:
+                failures.append(repr(e))
+
+    try:
+        with ProcessMonitor(exclude_pids=exclude_pids) as monitor, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            t1 = time.perf_counter()
+            list(executor.map(worker, range(concurrency)))
+            elapsed = time.perf_counter() - t1
+    finally:
+        researcher.close()
+
+    return {
+        'concurrency': concurrency,
+        'reports': len(latencies),
+        'failed': len(failures),
+        'errors': sorted(set(failures))[:3],
+        'throughput': len(latencies) / elapsed * 60,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'peak_rss_mb': monitor.peak_rss / 2**20,
+        'rss_increase_mb': (monitor.peak_rss - monitor.start_rss) / 2**20,
+        'loop_lag_p99_ms': percentile(monitor.lags, 99) * 1e3,
+        'loop_lag_max_ms': max(monitor.lags, default=float('nan')) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive concurrent Researcher runs against local fake LLM and web search servers.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='Concurrent reports (K) per level')
+    parser.add_argument('--reports-per-worker', type=int, default=2)
+    parser.add_argument('--sections', type=int, default=5, help='Sections in the fake plan')
+    parser.add_argument('--completion-tokens', type=int, default=500)
+    parser.add_argument('--source-chars', type=int, default=20000, help='Raw content length of each fake search result')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='Seconds')
+    parser.add_argument('--search-latency', type=float, default=0.5, help='Seconds')
+    parser.add_argument('--jitter', type=float, default=0.3, help='Relative latency jitter')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--search-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-rate-limit', type=float, default=0.0, help='Requests per second, 0 for no limit')
+    parser.add_argument('--search-rate-limit', type=float, default=0.0, help='Requests per second, 0 for no limit')
+    parser.add_argument('--section-workers', type=int, default=0, help='Worker processes for section research, 0 for in-process')
+    parser.add_argument('--out', type=str, default='', help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    llm_server, llm_url = start_server(
+        kind='llm',
+        profile_args={'latency': args.llm_latency, 'jitter': args.jitter, 'error_rate': args.llm_error_rate, 'rate_limit': args.llm_rate_limit},
+        params={'number_of_sections': args.sections, 'completion_tokens': args.completion_tokens},
+    )
+    search_server, search_url = start_server(
+        kind='search',
+        profile_args={'latency': args.search_latency, 'jitter': args.jitter, 'error_rate': args.search_error_rate, 'rate_limit': args.search_rate_limit},
+        params={'results_per_query': 3, 'source_chars': args.source_chars},
+    )
+    redirect_web_search(search_url=f'{search_url}/search')
+    probe_report_loops()
+
+    config = report_config()
+    make_researcher = functools.partial(
+        Researcher,
+        llm_config=fake_llm_config(llm_url=llm_url),
+        web_search_api_key='fake',
+        section_workers=args.section_workers,
+        section_worker_setup=functools.partial(redirect_web_search, search_url=f'{search_url}/search'),
+    )
+
+    print(f"{'K':>4} | {'Reports':>7} | {'Failed':>6} | {'Reports/min':>11} | {'p50 (s)':>7} | {'p95 (s)':>7} | "
+          f"{'p99 (s)':>7} | {'Peak RSS (MB)':>13} | {'RSS +(MB)':>9} | {'Loop lag p99 (ms)':>17} | {'Loop lag max (ms)':>17}")
+    print('RSS includes the section worker processes, loop lag is measured in the report loops of this process only '
+          '(not in the section worker processes).')
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            r = run_level(make_researcher=make_researcher, config=config, concurrency=concurrency, reports_per_worker=args.reports_per_worker,
+                          exclude_pids={llm_server.pid, search_server.pid})
+            results.append(r)
+            print(f"{r['concurrency']:>4} | {r['reports']:>7} | {r['failed']:>6} | {r['throughput']:>11.2f} | {r['p50']:>7.2f} | "
+                  f"{r['p95']:>7.2f} | {r['p99']:>7.2f} | {r['peak_rss_mb']:>13.1f} | {r['rss_increase_mb']:>9.1f} | "
+                  f"{r['loop_lag_p99_ms']:>17.1f} | {r['loop_lag_max_ms']:>17.1f}")
+            for error in r['errors']:
+                print(f'       {error[:200]}')
+    finally:
+        llm_server.terminate()
+        search_server.terminate()
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ import time
 from uuid import uuid4
 from md2pdf.core import md2pdf
 
-from ai_common import LlmServers, PRICE_USD_PER_MILLION_TOKENS
+from ai_common import LlmServers
 from config import settings
 from src.deep_sage import Researcher
 
@@ -57,6 +57,7 @@ def main():
     config = {
         "configurable": {
             'thread_id': str(uuid4()),
+            'max_cost_usd': 1.0,
             'max_iterations': 3,
             'max_results_per_query': 4,
             'max_tokens_per_source': 10000,
@@ -80,20 +81,22 @@ def main():
         }
 
     researcher = Researcher(llm_config=llm_config, web_search_api_key=settings.TAVILY_API_KEY)
+    estimate = researcher.estimate_cost(config=config)
+    print(f"Estimated cost (upper bound): {estimate['cost_usd']:.4f} USD")
+
     t1 = time.time()
     out_dict = researcher.run(topic=topic, config=config)
     t2 = time.time()
     print(f'Report generation took {(t2 - t1):.2f} seconds')
 
-    total_cost = 0
-    for model_type, params in llm_config.items():
-        model_provider = params['model_provider']
-        model = params['model']
-        price_dict = PRICE_USD_PER_MILLION_TOKENS[model_provider][model]
-        cost = sum([price_dict[k] * out_dict['token_usage'][model][k] for k in price_dict.keys()]) / 1e6
-        total_cost += cost
-        print(f'Cost for {model_provider}: {model} --> {cost:.4f} USD')
-    print(f'Total Token Usage Cost: {total_cost:.4f} USD')
+    usage = out_dict['usage']
+    for model, model_usage in usage['by_model'].items():
+        print(f"Cost for {model} --> {model_usage['cost_usd']:.4f} USD")
+    for node, node_usage in usage['by_node'].items():
+        print(f"Cost for {node} --> {node_usage['cost_usd']:.4f} USD")
+    if usage['budget_exceeded']:
+        print(f"Research stopped at the budget of {usage['max_cost_usd']:.4f} USD")
+    print(f"Total Token Usage Cost: {usage['cost_usd']:.4f} USD")
 
     ## Save Markdown and PDF files
     t_now = datetime.datetime.now().replace(microsecond=0).astimezone(
@@ -0,0 +1,96 @@
+from langgraph.graph import END, START, StateGraph
+
+from src.deep_sage.checkpoint import ContentAddressedMemorySaver, ContentAddressedSerializer
+from src.deep_sage.state import ReportState, Section
+
+SOURCES = {f'https://example.com/{i}': {'title': f'Source {i}', 'content': f'content {i} ' * 300} for i in range(3)}
+
+
+def make_state() -> ReportState:
+    return ReportState(content='', iteration=0, report_title='', sections=[], search_queries=[], source_str='',
+                       steps=[], token_usage={}, topic='Test topic', unique_sources={})
+
+
+def plan(state: ReportState) -> ReportState:
+    state.sections = [
+        Section(name=f'Section {i}', description='Description', research=i == 1, content='', unique_sources={})
+        for i in range(3)
+    ]
+    state.source_str = 'planner context ' * 500
+    state.unique_sources = SOURCES
+    state.steps.append('planner')
+    return state
+
+
+def write(state: ReportState) -> ReportState:
+    for section in state.sections:
+        section.content = f'{section.name} content ' * 200
+        section.unique_sources = SOURCES if section.research else {}
+    state.steps.append('writer')
+    return state
+
+
+def finalize(state: ReportState) -> ReportState:
+    state.content = ''.join([f'\n\n## {section.name}\n\n{section.content}' for section in state.sections])
+    state.steps.append('finalizer')
+    return state
+
+
+def build_graph(memory_saver: ContentAddressedMemorySaver):
+    workflow = StateGraph(ReportState)
+    workflow.add_node('planner', plan)
+    workflow.add_node('writer', write)
+    workflow.add_node('finalizer', finalize)
+    workflow.add_edge(START, 'planner')
+    workflow.add_edge('planner', 'writer')
+    workflow.add_edge('writer', 'finalizer')
+    workflow.add_edge('finalizer', END)
+    return workflow.compile(checkpointer=memory_saver)
+
+
+def run_graph(graph, thread_id: str) -> dict:
+    return graph.invoke(make_state(), {'configurable': {'thread_id': thread_id}})
+
+
+def test_serializer_round_trip():
+    serde = ContentAddressedSerializer(min_blob_size=64)
+    state = finalize(write(plan(make_state())))
+    for field in type(state).model_fields:
+        value = getattr(state, field)
+        assert serde.loads_typed(serde.dumps_typed(value)) == value
+    assert serde.blobs
+
+
+def test_graph_state_round_trip():
+    memory_saver = ContentAddressedMemorySaver()
+    graph = build_graph(memory_saver)
+    out_state = run_graph(graph, thread_id='1')
+
+    snapshot = graph.get_state({'configurable': {'thread_id': '1'}})
+    assert ReportState(**snapshot.values) == ReportState(**out_state)
+    assert snapshot.values['steps'] == ['planner', 'writer', 'finalizer']
+    # Each step checkpoints the unchanged sources again, they are stored once
+    assert memory_saver.cas.blobs
+    history = list(graph.get_state_history({'configurable': {'thread_id': '1'}}))
+    assert [s.values.get('steps') for s in history[:3]] == [
+        ['planner', 'writer', 'finalizer'], ['planner', 'writer'], ['planner'],
+    ]
+
+
+def test_delete_thread_frees_blobs():
+    memory_saver = ContentAddressedMemorySaver()
+    graph = build_graph(memory_saver)
+    run_graph(graph, thread_id='1')
+    run_graph(graph, thread_id='2')
+    blobs = set(memory_saver.cas.blobs)
+
+    # The checkpoints of thread 1 are freed, the content both threads stored is kept for thread 2
+    memory_saver.delete_thread('1')
+    assert set(memory_saver.cas.blobs) < blobs
+    assert plan(make_state()).source_str in memory_saver.cas.blobs.values()
+    snapshot = graph.get_state({'configurable': {'thread_id': '2'}})
+    assert snapshot.values['content'] == finalize(write(plan(make_state()))).content
+
+    memory_saver.delete_thread('2')
+    assert not memory_saver.cas.blobs
+    assert not memory_saver.storage
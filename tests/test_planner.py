@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from pydantic import Field
+
+from src.deep_sage.components import Planner
+
+MODEL_PARAMS = {'model': 'gpt-4o-mini', 'model_provider': 'openai', 'api_key': 'fake', 'model_args': {}}
+INTRO = {'name': 'Introduction', 'description': 'Overview', 'research': 'no', 'content': '', 'unique_sources': {}}
+BODY = {'name': 'Body', 'description': 'Main topic', 'research': 'yes', 'content': '', 'unique_sources': {}}
+
+
+class RecordingChatModel(GenericFakeChatModel):
+    """Fake chat model answering with the given replies and recording its prompts."""
+    prompts: list[str] = Field(default_factory=list)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def make_planner(repair_replies: list[str]) -> Planner:
+    planner = Planner(
+        llm_config={'language_model': MODEL_PARAMS, 'reasoning_model': MODEL_PARAMS},
+        web_search_api_key='fake',
+        configuration_module_prefix='src.deep_sage.configuration',
+    )
+    planner.base_llm = RecordingChatModel(messages=iter([]))
+    planner.repair_llm = RecordingChatModel(messages=iter([AIMessage(content=reply) for reply in repair_replies]))
+    return planner
+
+
+def test_parse_sections_without_repair():
+    planner = make_planner(repair_replies=[])
+    sections = planner.parse_sections(text=json.dumps({'sections': [INTRO, BODY]}))
+    assert [(s.name, s.research) for s in sections] == [('Introduction', False), ('Body', True)]
+    assert planner.repair_llm.prompts == []
+
+
+def test_parse_sections_repairs_whole_plan():
+    text = 'Sections: Introduction (no research), Body (research)'
+    planner = make_planner(repair_replies=[json.dumps({'sections': [INTRO, BODY]})])
+    sections = planner.parse_sections(text=text)
+    assert [s.name for s in sections] == ['Introduction', 'Body']
+    assert len(planner.repair_llm.prompts) == 1 and text in planner.repair_llm.prompts[0]
+    assert planner.base_llm.prompts == []
+
+
+def test_parse_sections_repairs_only_invalid_fragments():
+    invalid = BODY | {'research': 'maybe'}
+    # The repaired fragment may come back wrapped in a plan
+    planner = make_planner(repair_replies=[json.dumps({'sections': [BODY]})])
+    sections = planner.parse_sections(text=json.dumps({'sections': [INTRO, invalid]}))
+    assert [(s.name, s.research) for s in sections] == [('Introduction', False), ('Body', True)]
+    assert len(planner.repair_llm.prompts) == 1
+    assert json.dumps(invalid) in planner.repair_llm.prompts[0]
+    assert json.dumps(INTRO) not in planner.repair_llm.prompts[0]
+    assert planner.base_llm.prompts == []
+
+
+def test_parse_sections_drops_unfixable_fragments():
+    planner = make_planner(repair_replies=['Sorry, I cannot fix this.'])
+    sections = planner.parse_sections(text=json.dumps({'sections': [INTRO, {'description': 'No name'}]}))
+    assert [s.name for s in sections] == ['Introduction']
+    assert len(planner.repair_llm.prompts) == 1
+
+
+def test_parse_sections_without_valid_section():
+    planner = make_planner(repair_replies=['{}', 'still no plan'])
+    with pytest.raises(ValueError):
+        planner.parse_sections(text='no plan')
+    assert len(planner.repair_llm.prompts) == 1
@@ -0,0 +1,120 @@
+import functools
+import os
+from concurrent.futures.process import BrokenProcessPool
+from uuid import uuid4
+
+import pytest
+import tavily
+
+from src.deep_sage import Researcher
+from src.deep_sage.components import SectionsWriter
+from src.deep_sage.enums import Node
+from src.deep_sage.state import ReportState, Section
+from src.fake_servers import fake_llm_config, redirect_web_search, report_config, start_server
+
+NUMBER_OF_SECTIONS = 4
+NO_FAULTS = {'latency': 0.0, 'jitter': 0.0, 'error_rate': 0.0, 'rate_limit': 0.0}
+
+
+@pytest.fixture(scope='module')
+def fake_servers():
+    llm_server, llm_url = start_server(
+        kind='llm', profile_args=NO_FAULTS, params={'number_of_sections': NUMBER_OF_SECTIONS, 'completion_tokens': 50}
+    )
+    search_server, search_url = start_server(
+        kind='search', profile_args=NO_FAULTS, params={'results_per_query': 2, 'source_chars': 1000}
+    )
+    search, async_search = tavily.TavilyClient.search, tavily.AsyncTavilyClient.search
+    redirect_web_search(search_url=f'{search_url}/search')
+    yield llm_url, f'{search_url}/search'
+    tavily.TavilyClient.search, tavily.AsyncTavilyClient.search = search, async_search
+    llm_server.terminate()
+    search_server.terminate()
+
+
+@pytest.fixture(scope='module')
+def failing_llm_url():
+    llm_server, llm_url = start_server(
+        kind='llm', profile_args=NO_FAULTS | {'error_rate': 1.0}, params={'number_of_sections': NUMBER_OF_SECTIONS, 'completion_tokens': 50}
+    )
+    yield llm_url
+    llm_server.terminate()
+
+
+@pytest.fixture(scope='module')
+def researcher(fake_servers):
+    llm_url, search_url = fake_servers
+    researcher = Researcher(
+        llm_config=fake_llm_config(llm_url=llm_url),
+        web_search_api_key='fake',
+        section_workers=2,
+        section_worker_setup=functools.partial(redirect_web_search, search_url=search_url),
+    )
+    with researcher:
+        yield researcher
+
+
+def run_report(researcher: Researcher) -> dict:
+    config = report_config()
+    config['configurable']['thread_id'] = str(uuid4())
+    return researcher.run(topic='Test topic', config=config)
+
+
+def test_run_with_section_workers(researcher):
+    out_dict = run_report(researcher)
+
+    # Introduction and conclusion are written by the FinalWriter, the other sections by the workers
+    research_sections = {f'Section {i}' for i in range(1, NUMBER_OF_SECTIONS - 1)}
+    assert set(out_dict['usage']['by_section']) == research_sections
+    assert out_dict['usage']['by_node'][Node.SECTIONS_WRITER]['calls'] > 0
+    for name in research_sections:
+        assert f'## {name}\n\n' in out_dict['content']
+    # The thread of the report is deleted after the run, together with its blobs
+    assert not researcher.memory_saver.storage
+    assert not researcher.memory_saver.cas.blobs
+
+
+def test_broken_process_pool_is_replaced(researcher):
+    broken_pool = researcher.sections_writer.process_pool
+    with pytest.raises(BrokenProcessPool):
+        broken_pool.submit(os._exit, 1).result()
+
+    # The report running into the broken pool may fail, the following ones use a new pool
+    try:
+        run_report(researcher)
+    except BrokenProcessPool:
+        pass
+    assert researcher.sections_writer.process_pool is not broken_pool
+    assert run_report(researcher)['usage']['by_section']
+
+
+def test_llm_errors_do_not_break_process_pool(fake_servers, failing_llm_url):
+    _, search_url = fake_servers
+    sections_writer = SectionsWriter(
+        llm_config=fake_llm_config(llm_url=failing_llm_url, max_retries=0),
+        web_search_api_key='fake',
+        configuration_module_prefix='src.deep_sage.configuration',
+        max_workers=1,
+        worker_setup=functools.partial(redirect_web_search, search_url=search_url),
+    )
+    process_pool = sections_writer.process_pool
+    state = ReportState(
+        content='',
+        iteration=0,
+        report_title='',
+        sections=[Section(name='Section 1', description='Description', research=True, content='', unique_sources={})],
+        search_queries=[],
+        source_str='',
+        steps=[],
+        token_usage={},
+        topic='Test topic',
+        unique_sources={},
+    )
+    try:
+        # The 5xx errors of the LLM server reach the parent as RuntimeError, for each report
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match='InternalServerError'):
+                sections_writer.run(state=state.model_copy(deep=True), config=report_config())
+        assert sections_writer.process_pool is process_pool
+    finally:
+        sections_writer.close()
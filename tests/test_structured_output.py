@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src.deep_sage.structured_output import coerce_section, parse_json_object, repair_json, strip_thinking_tokens
+
+
+@pytest.mark.parametrize('text, expected', [
+    # Unquoted keys
+    ('{name: "Intro", research: "no"}', {'name': 'Intro', 'research': 'no'}),
+    # Bare words, also with apostrophes and hyphens
+    ('{note: don\'t do it}', {'note': "don't do it"}),
+    ('{name: Real-world examples}', {'name': 'Real-world examples'}),
+    ('{name: 3D printing, year: 2024}', {'name': '3D printing', 'year': 2024}),
+    # Python literals
+    ('{"a": True, "b": False, "c": None}', {'a': True, 'b': False, 'c': None}),
+    # Single-quoted strings, with double quotes inside
+    ('{\'name\': \'The "best" one\'}', {'name': 'The "best" one'}),
+    # Missing commas
+    ('{"a": "x" "b": "y"}', {'a': 'x', 'b': 'y'}),
+    ('{"a": [1 2 3]}', {'a': [1, 2, 3]}),
+    # Trailing commas
+    ('{"a": [1, 2,], "b": {"c": 1,},}', {'a': [1, 2], 'b': {'c': 1}}),
+    # Unclosed brackets of truncated output
+    ('{"sections": [{"name": "Intro"', {'sections': [{'name': 'Intro'}]}),
+    ('{"a": ', {'a': None}),
+    # Raw control characters in strings
+    ('{"a": "line 1\nline 2\ttab"}', {'a': 'line 1\nline 2\ttab'}),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_repair_json_keeps_valid_json():
+    text = '{"sections": [{"name": "A", "research": true, "unique_sources": {}}], "n": -1.5e3}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+
+def test_strip_thinking_tokens():
+    assert strip_thinking_tokens('<think>{"a": 1}</think>\n{"b": 2}') == '{"b": 2}'
+    assert strip_thinking_tokens('unterminated {"a": 1}</think>{"b": 2}') == '{"b": 2}'
+
+
+@pytest.mark.parametrize('text', [
+    '{"sections": [{"name": "A"}]}',
+    'Here is the plan:\n```json\n{"sections": [{"name": "A"}]}\n```',
+    '<think>Maybe {"sections": []}?</think>{"sections": [{"name": "A"}]}',
+    # Trailing text containing braces
+    '{"sections": [{"name": "A"}]}\nUse {topic} to fill in the details.',
+    '{"sections": [{"name": "A"}]} and {"other": 1}',
+    # Faulty object followed by text
+    '{sections: [{name: A,}]} Note: don\'t use {braces}.',
+    # Preferred over a preceding object without sections
+    '{"draft": true} then {"sections": [{"name": "A"}]}',
+])
+def test_parse_json_object(text):
+    assert parse_json_object(text) == {'sections': [{'name': 'A'}]}
+
+
+def test_parse_json_object_ignores_thinking():
+    text = '<think>draft {"sections": [{"name": "draft"}]}</think>{"sections": [{"name": "final"}]}'
+    assert parse_json_object(text) == {'sections': [{'name': 'final'}]}
+
+
+def test_parse_json_object_without_object():
+    assert parse_json_object('No JSON here.') is None
+    assert parse_json_object('{"a": 1} {"b": 2}') == {'a': 1}
+
+
+def test_coerce_section():
+    section = coerce_section({'Name': 'Intro', 'Description': 'Overview', 'Research': 'No.', 'Unique Sources': None})
+    assert (section.name, section.description, section.research, section.content, section.unique_sources) == \
+           ('Intro', 'Overview', False, '', {})
+    assert coerce_section({'name': 'A', 'description': 'B', 'research': 'yes'}).research is True
+
+
+@pytest.mark.parametrize('fragment', [
+    'Intro',
+    {'description': 'No name', 'research': True},
+    {'name': 'A', 'description': 'B', 'research': 'maybe'},
+])
+def test_coerce_section_invalid(fragment):
+    with pytest.raises(ValueError):
+        coerce_section(fragment)
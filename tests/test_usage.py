@@ -0,0 +1,150 @@
+import logging
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+from src.deep_sage import Researcher
+from src.deep_sage.components import SectionsWriter
+from src.deep_sage.configuration import Configuration
+from src.deep_sage.enums import Node
+from src.deep_sage.state import ReportState, Section
+from src.deep_sage.usage import (PLAN_TOKENS, PROMPT_TOKENS, QUERY_TOKENS, BudgetExceededError, UsageLedger, UsageScope,
+                                 estimate_usage, get_usage_ledger, usage_ledger, usage_scope, with_usage_ledger)
+
+MODEL = 'fake-model'
+PRICES = {MODEL: {'input_tokens': 1.0, 'output_tokens': 10.0}}  # USD per million tokens
+CONFIGURABLE = {'max_iterations': 2, 'max_results_per_query': 3, 'max_tokens_per_source': 100, 'number_of_days_back': 1,
+                'number_of_queries': 2, 'sections_config': {}}
+MODEL_PARAMS = {'model': MODEL, 'model_provider': 'openai', 'api_key': 'fake', 'model_args': {}}
+USAGE = {'input_tokens': 1000, 'output_tokens': 100, 'total_tokens': 1100}
+
+
+def fake_llm(calls: int = 1) -> GenericFakeChatModel:
+    messages = [AIMessage(content='ok', usage_metadata=USAGE, response_metadata={'model_name': MODEL}) for _ in range(calls)]
+    return GenericFakeChatModel(messages=iter(messages))
+
+
+def make_state(sections: list[Section], token_usage: dict) -> ReportState:
+    return ReportState(content='', iteration=0, report_title='', sections=sections, search_queries=[], source_str='',
+                       steps=[], token_usage=token_usage, topic='Test topic', unique_sources={})
+
+
+def test_record_merge_and_aggregates():
+    ledger = UsageLedger(prices=PRICES)
+    usage_metadata = USAGE | {'input_token_details': {'cache_read': 200}, 'output_token_details': {'reasoning': 50}}
+    ledger.record(model=MODEL, usage_metadata=usage_metadata, scope=UsageScope(node=Node.PLANNER))
+    ledger.merge(entries={
+        (Node.SECTIONS_WRITER, 'Section 1', MODEL): {'input_tokens': 2000, 'output_tokens': 200, 'calls': 2},
+    })
+
+    by_model = ledger.by_model()[MODEL]
+    assert (by_model['input_tokens'], by_model['output_tokens'], by_model['cache_read'], by_model['reasoning'],
+            by_model['calls']) == (3000, 300, 200, 50, 3)
+    assert ledger.cost_usd == pytest.approx((3000 * 1.0 + 300 * 10.0) / 1e6)
+    assert set(ledger.by_node()) == {Node.PLANNER, Node.SECTIONS_WRITER}
+    assert ledger.by_node()[Node.SECTIONS_WRITER]['cost_usd'] == pytest.approx((2000 + 2000) / 1e6)
+    assert set(ledger.by_section()) == {'Section 1'}  # Calls outside of sections are not listed
+    assert ledger.token_usage(models=['other-model']) == {
+        MODEL: {'input_tokens': 3000, 'output_tokens': 300},
+        'other-model': {'input_tokens': 0, 'output_tokens': 0},
+    }
+
+
+def test_calls_are_recorded_per_scope():
+    ledger = UsageLedger(prices=PRICES)
+    llm = fake_llm(calls=2)
+    with usage_ledger(ledger):
+        with usage_scope(node=Node.SECTIONS_WRITER, section='Section 1'):
+            llm.invoke('hi')
+        llm.invoke('hi')
+    assert ledger.by_section()['Section 1']['calls'] == 1
+    assert ledger.by_model()[MODEL]['calls'] == 2
+
+
+def test_budget_refuses_calls_in_stop_on_budget_scope(caplog):
+    ledger = UsageLedger(prices=PRICES, max_cost_usd=0.001)
+    llm = fake_llm(calls=2)
+    with usage_ledger(ledger), caplog.at_level(logging.INFO):
+        llm.invoke('hi')  # 0.002 USD, over the budget
+        with usage_scope(stop_on_budget=True), pytest.raises(BudgetExceededError):
+            llm.invoke('hi')
+    assert ledger.budget_exceeded
+    assert ledger.by_model()[MODEL]['calls'] == 1
+    # An expected stop, not a callback error
+    assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+    assert any('stopped by the budget' in r.getMessage() for r in caplog.records)
+
+
+def test_budget_does_not_refuse_calls_outside_stop_on_budget_scope():
+    ledger = UsageLedger(prices=PRICES, max_cost_usd=0.0)
+    llm = fake_llm(calls=2)
+    with usage_ledger(ledger):
+        llm.invoke('hi')
+        with usage_scope(stop_on_budget=False):
+            llm.invoke('hi')
+    assert ledger.by_model()[MODEL]['calls'] == 2
+
+
+class Component:
+    def __init__(self):
+        self.llm = fake_llm()
+
+    @with_usage_ledger
+    def run(self, state: BaseModel, config: dict) -> BaseModel:
+        self.llm.invoke('hi')
+        state.token_usage = get_usage_ledger().token_usage(models=[*state.token_usage.keys()])
+        return state
+
+
+def test_with_usage_ledger_seeds_local_ledger():
+    state = make_state(sections=[], token_usage={MODEL: {'input_tokens': 5, 'output_tokens': 1}})
+    state = Component().run(state, {})
+    assert state.token_usage == {MODEL: {'input_tokens': 1005, 'output_tokens': 101}}
+
+
+def test_with_usage_ledger_uses_report_ledger():
+    ledger = UsageLedger(prices=PRICES)
+    state = make_state(sections=[], token_usage={MODEL: {'input_tokens': 5, 'output_tokens': 1}})
+    with usage_ledger(ledger):
+        state = Component().run(state, {})
+    assert state.token_usage == {MODEL: {'input_tokens': 1000, 'output_tokens': 100}}
+    assert ledger.by_model()[MODEL]['calls'] == 1
+
+
+def test_sections_writer_stops_research_at_budget():
+    sections_writer = SectionsWriter(
+        llm_config={'language_model': MODEL_PARAMS, 'reasoning_model': MODEL_PARAMS},
+        web_search_api_key='fake',
+        configuration_module_prefix='src.deep_sage.configuration',
+    )
+    sections = [
+        Section(name=f'Section {i}', description='Description', research=0 < i < 3, content='', unique_sources={})
+        for i in range(4)
+    ]
+    state = make_state(sections=sections, token_usage={})
+    with usage_ledger(UsageLedger(prices=PRICES, max_cost_usd=0.0)):
+        state = sections_writer.run(state=state, config={'configurable': {}})
+    assert [(s.research, s.budget_stopped, s.content) for s in state.sections] == \
+           [(False, False, ''), (True, True, ''), (True, True, ''), (False, False, '')]
+
+
+def test_researcher_refuses_budget_without_prices():
+    researcher = Researcher(llm_config={'language_model': MODEL_PARAMS, 'reasoning_model': MODEL_PARAMS},
+                            web_search_api_key='fake')
+    researcher.prices = {MODEL: {}}
+    with pytest.raises(ValueError, match=MODEL):
+        researcher.run(topic='Test topic', config={'configurable': CONFIGURABLE | {'thread_id': '1', 'max_cost_usd': 1.0}})
+
+
+def test_estimate_usage():
+    configurable = Configuration(**CONFIGURABLE)
+    usage = estimate_usage(configurable=configurable, language_model='lm', reasoning_model='rm', number_of_sections=2)
+    # Without research sections, only the planner uses the reasoning model
+    assert usage['rm'] == {'input_tokens': PROMPT_TOKENS + 2 * 3 * 100, 'output_tokens': PLAN_TOKENS}
+    assert usage['lm']['output_tokens'] > QUERY_TOKENS * 2
+
+    more_sections = estimate_usage(configurable=configurable, language_model='lm', reasoning_model='rm', number_of_sections=5)
+    assert more_sections['rm']['input_tokens'] > usage['rm']['input_tokens']
+    assert more_sections['lm']['input_tokens'] > usage['lm']['input_tokens']